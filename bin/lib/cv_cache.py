@@ -0,0 +1,148 @@
+################################################################################
+#
+# Copyright 2020 OpenHW Group
+#
+# Licensed under the Solderpad Hardware Licence, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://solderpad.org/licenses/
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier:Apache-2.0 WITH SHL-2.0
+#
+################################################################################
+
+import os
+import json
+import hashlib
+import time
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Days after which unused make fragments are removed, see write_make()
+FRAGMENT_MAX_AGE = 7
+
+def get_proj_root():
+    '''Fetch absolute path of core-v-verif directory'''
+    return os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", ".."))
+
+def get_cache_dir(*subdirs):
+    '''Fetch (and create) a directory for persistent caches of the utilities.
+       CV_CACHE_DIR overrides the default of $XDG_CACHE_HOME/core-v-verif'''
+    try:
+        root = os.environ['CV_CACHE_DIR']
+    except KeyError:
+        root = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                            'core-v-verif')
+
+    path = os.path.join(root, *subdirs)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def get_checkout_id():
+    '''Short identifier of this core-v-verif checkout, used to keep caches of
+       different checkouts apart'''
+    return hashlib.sha1(get_proj_root().encode('utf-8')).hexdigest()[:12]
+
+def load_json(path, default=None):
+    '''Read a JSON cache file, returning default if missing or unreadable'''
+    try:
+        with open(path, 'r') as fh:
+            return json.load(fh)
+    except (OSError, ValueError) as e:
+        logger.debug('Could not read {}: {}'.format(path, e))
+        return default
+
+def save_json(path, data):
+    '''Atomically write a JSON cache file, failures are not fatal'''
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp, 'w') as fh:
+            json.dump(data, fh)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.debug('Could not write {}: {}'.format(path, e))
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+def write_content_addressed(content, directory, suffix=''):
+    '''Write content to a file in directory named after its hash and return the path.
+       An existing file with the same content is reused (and its mtime refreshed
+       so that cleanup_dir() sees it as recently used).'''
+    path = os.path.join(directory, hashlib.sha1(content.encode('utf-8')).hexdigest() + suffix)
+    if os.path.exists(path):
+        try:
+            os.utime(path)
+        except OSError:
+            # Owned by another user of a shared directory
+            pass
+        logger.debug('Reusing {}'.format(path))
+        return path
+
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as fh:
+        fh.write(content)
+    os.replace(tmp, path)
+    return path
+
+def write_make(content, path=None, fragment_dir=None, max_age_days=FRAGMENT_MAX_AGE):
+    '''Write a makefile fragment to path, or when no path is given to a file
+       named after its contents in fragment_dir (default: the user cache
+       directory), which is reused by later calls with the same contents.
+       Fragments not used for max_age_days are removed.'''
+    if path:
+        with open(path, 'w') as fh:
+            fh.write(content)
+        return path
+
+    try:
+        if fragment_dir:
+            os.makedirs(fragment_dir, exist_ok=True)
+        else:
+            fragment_dir = get_cache_dir('fragments')
+        path = write_content_addressed(content, fragment_dir, '.mk')
+        cleanup_dir(fragment_dir, max_age_days)
+        return path
+    except OSError as e:
+        logger.debug('Fragment directory not usable, using a temporary file: {}'.format(e))
+
+    fh = tempfile.NamedTemporaryFile(mode='w', delete=False)
+    fh.write(content)
+    fh.close()
+
+    return fh.name
+
+def cleanup_dir(directory, max_age_days, interval_hours=24):
+    '''Remove files of directory not used for max_age_days.
+       The scan runs at most once per interval_hours, tracked by a stamp file.'''
+    stamp = os.path.join(directory, '.last_cleanup')
+    now = time.time()
+    try:
+        if now - os.stat(stamp).st_mtime < interval_hours * 3600:
+            return
+    except FileNotFoundError:
+        pass
+
+    try:
+        with open(stamp, 'w'):
+            pass
+        for e in os.scandir(directory):
+            if e.name == '.last_cleanup' or not e.is_file():
+                continue
+            try:
+                if now - e.stat().st_mtime > max_age_days * 86400:
+                    os.remove(e.path)
+            except FileNotFoundError:
+                pass
+    except OSError as e:
+        logger.debug('Could not clean up {}: {}'.format(directory, e))
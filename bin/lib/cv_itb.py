@@ -0,0 +1,212 @@
+################################################################################
+#
+# Copyright 2020 OpenHW Group
+#
+# Licensed under the Solderpad Hardware Licence, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://solderpad.org/licenses/
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier:Apache-2.0 WITH SHL-2.0
+#
+################################################################################
+#
+# cv_itb: binary (indexed) instruction table format written by objdump2itb
+#
+# The binary ITB holds the same per-instruction information as the text .itb
+# (without the source code blocks) in a form that can be searched in place:
+#
+#   header    : magic, version, record count and section offsets
+#   addresses : <count> little-endian uint64 instruction addresses, sorted
+#   records   : <count> fixed-width records (size, mcode, function, file,
+#               line, asm), in the same order as the addresses
+#   strings   : pool of NUL-terminated UTF-8 strings referenced by offset
+#
+# Readers mmap the file and bisect the address column, so resolving a PC
+# does not require parsing the whole table.
+#
+################################################################################
+
+import os
+import sys
+import mmap
+import struct
+import bisect
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CVITB\x00\x00\x00'
+VERSION = 1
+
+# magic, version, count, addr_offset, rec_offset, str_offset, str_size
+HEADER = struct.Struct('<8sIIIIII')
+ADDR = struct.Struct('<Q')
+# size (bytes), mcode, function, file, line, asm
+RECORD = struct.Struct('<IIIIII')
+
+# String offset used for a missing string (e.g. no source file seen yet)
+NO_STRING = 0xffffffff
+
+ItbEntry = namedtuple('ItbEntry', ['addr', 'size', 'mcode', 'function', 'file', 'line', 'asm'])
+
+class ItbWriter:
+    '''Collects instructions and writes them as a binary ITB'''
+    def __init__(self):
+        self.records = []
+        self.strings = {}
+        self.pool = bytearray()
+
+    def intern(self, s):
+        '''Return the string pool offset of s, adding it if needed'''
+        if s is None:
+            return NO_STRING
+        try:
+            return self.strings[s]
+        except KeyError:
+            offset = len(self.pool)
+            self.pool += s.encode('utf-8') + b'\x00'
+            self.strings[s] = offset
+            return offset
+
+    def add(self, addr, mcode, function, file, line, asm):
+        '''Add one instruction, mcode is the hex string from the objdump'''
+        self.records.append((addr,
+                             RECORD.pack(len(mcode) // 2,
+                                         int(mcode, 16),
+                                         self.intern(function),
+                                         self.intern(file),
+                                         int(line) if line else 0,
+                                         self.intern(asm))))
+
+    def write(self, path):
+        '''Write the address-sorted table to path'''
+        # Stable sort, the first instruction listed for an address wins
+        self.records.sort(key=lambda r: r[0])
+        count = len(self.records)
+        addr_offset = HEADER.size
+        rec_offset = addr_offset + count * ADDR.size
+        str_offset = rec_offset + count * RECORD.size
+
+        with open(path, 'wb') as fh:
+            fh.write(HEADER.pack(MAGIC, VERSION, count, addr_offset, rec_offset, str_offset, len(self.pool)))
+            fh.write(b''.join(ADDR.pack(r[0]) for r in self.records))
+            fh.write(b''.join(r[1] for r in self.records))
+            fh.write(self.pool)
+
+        logger.debug('Wrote {} instructions and {} bytes of strings to {}'.format(count, len(self.pool), path))
+
+class _AddressColumn:
+    '''Sequence view of the address column for bisect on big-endian hosts'''
+    def __init__(self, buf, offset, count):
+        self.buf = buf
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return ADDR.unpack_from(self.buf, self.offset + i * ADDR.size)[0]
+
+class ItbReader:
+    '''Memory-mapped reader for a binary ITB'''
+    def __init__(self, path):
+        self.path = path
+        self.fh = open(path, 'rb')
+        self.mm = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.count, self.addr_offset,
+         self.rec_offset, self.str_offset, self.str_size) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('{} is not a version {} binary ITB file'.format(path, VERSION))
+
+        if sys.byteorder == 'little':
+            self.addrs = memoryview(self.mm)[self.addr_offset:self.rec_offset].cast('Q')
+        else:
+            self.addrs = _AddressColumn(self.mm, self.addr_offset, self.count)
+        self.string_cache = {}
+
+    def close(self):
+        '''Release the mapping'''
+        if isinstance(getattr(self, 'addrs', None), memoryview):
+            self.addrs.release()
+        self.addrs = None
+        self.mm.close()
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.entry(i)
+
+    def string(self, offset):
+        '''Fetch a string from the pool'''
+        if offset == NO_STRING:
+            return None
+        try:
+            return self.string_cache[offset]
+        except KeyError:
+            start = self.str_offset + offset
+            s = self.mm[start:self.mm.find(b'\x00', start)].decode('utf-8')
+            self.string_cache[offset] = s
+            return s
+
+    def entry(self, i):
+        '''Return the ItbEntry at record index i'''
+        size, mcode, function, file, line, asm = RECORD.unpack_from(self.mm, self.rec_offset + i * RECORD.size)
+        return ItbEntry(self.addrs[i], size, mcode, self.string(function), self.string(file), line, self.string(asm))
+
+    def index(self, pc):
+        '''Return the record index of the instruction containing pc, or None'''
+        i = bisect.bisect_right(self.addrs, pc) - 1
+        if i < 0:
+            return None
+        # Step back to the first record of a duplicated address
+        addr = self.addrs[i]
+        while i > 0 and self.addrs[i - 1] == addr:
+            i -= 1
+        size = RECORD.unpack_from(self.mm, self.rec_offset + i * RECORD.size)[0]
+        if pc >= addr + size:
+            return None
+        return i
+
+    def lookup(self, pc):
+        '''Resolve pc to an ItbEntry, or None if no instruction covers it'''
+        i = self.index(pc)
+        if i is None:
+            return None
+        return self.entry(i)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Resolve PCs using a binary ITB file')
+    parser.add_argument('bitb', help='Binary ITB file written by objdump2itb --bitb')
+    parser.add_argument('pc', nargs='+', help='PC(s) to resolve, decimal or 0x-prefixed hex')
+    args = parser.parse_args()
+
+    with ItbReader(args.bitb) as itb:
+        for pc in args.pc:
+            e = itb.lookup(int(pc, 0))
+            if e is None:
+                print('{}: not found'.format(pc))
+            else:
+                print('{}: {} {}:{} {}'.format(pc, e.function, e.file, e.line, e.asm))
@@ -0,0 +1,178 @@
+################################################################################
+#
+# Copyright 2020 OpenHW Group
+#
+# Licensed under the Solderpad Hardware Licence, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://solderpad.org/licenses/
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier:Apache-2.0 WITH SHL-2.0
+#
+################################################################################
+
+import os
+import re
+import hashlib
+import time
+import concurrent.futures
+from collections import namedtuple, OrderedDict
+
+import cv_cache
+import cv_yaml
+
+# Result banner printed by the UVM testbenches at the end of a simulation
+BANNER = re.compile(rb'SIMULATION (PASSED|FAILED)')
+BLOCK_SIZE = 65536
+
+LOG_INDEX_VERSION = 1
+
+# Outcome of one simulation log: result is 'PASSED', 'FAILED' or None when the
+# log has no banner, line is the banner line, times are in seconds and cached
+# is set when the result came from the log index instead of reading the log
+LogResult = namedtuple('LogResult', ['path', 'name', 'result', 'line', 'mtime', 'scan_time', 'cached'])
+
+def find_logs(root):
+    '''Walk root once and yield the paths of the .log files, in sorted order'''
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for f in sorted(filenames):
+            if f.endswith('.log'):
+                yield os.path.join(dirpath, f)
+
+def find_banner(path):
+    '''Return the last result banner line of a log, reading backwards from its end,
+       or None if there is none'''
+    with open(path, 'rb') as fh:
+        end = fh.seek(0, os.SEEK_END)
+        carry = b''
+        while end > 0:
+            start = max(0, end - BLOCK_SIZE)
+            fh.seek(start)
+            lines = (fh.read(end - start) + carry).split(b'\n')
+            # The first line may begin in the previous block
+            carry = lines.pop(0) if start else b''
+            for line in reversed(lines):
+                if BANNER.search(line):
+                    return line.decode('utf-8', errors='replace').rstrip()
+            end = start
+    return None
+
+def read_tail(path, size=BLOCK_SIZE):
+    '''Return the last size bytes of a file decoded, or an empty string if unreadable'''
+    try:
+        with open(path, 'rb') as fh:
+            fh.seek(max(0, fh.seek(0, os.SEEK_END) - size))
+            return fh.read().decode('utf-8', errors='replace')
+    except OSError:
+        return ''
+
+def scan_log(path):
+    '''Scan one simulation log into a LogResult'''
+    start = time.time()
+    try:
+        mtime = os.stat(path).st_mtime
+        line = find_banner(path)
+    except OSError:
+        mtime = None
+        line = None
+    result = BANNER.search(line.encode('utf-8')).group(1).decode() if line else None
+    return LogResult(path, os.path.basename(path), result, line, mtime, time.time() - start, False)
+
+def get_index_path(root):
+    '''Fetch the path of the log index of results directory root'''
+    return os.path.join(cv_cache.get_cache_dir('logscan'),
+                        hashlib.sha1(os.path.abspath(root).encode('utf-8')).hexdigest() + '.json')
+
+def scan_logs(root, workers=None, use_index=True):
+    '''Scan every .log file under root on a thread pool, returns the LogResults in path order.
+       The results are kept in a per-directory log index, a log whose mtime and
+       size are unchanged since the previous scan is only stat'ed, not read.'''
+    index_path = get_index_path(root)
+    index = cv_cache.load_json(index_path, {}) if use_index else {}
+    logs = index.get('logs', {}) if index.get('version') == LOG_INDEX_VERSION else {}
+
+    results = OrderedDict()
+    stats = {}
+    for path in find_logs(root):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        stats[path] = [st.st_mtime_ns, st.st_size]
+        entry = logs.get(path)
+        if entry and entry[:2] == stats[path]:
+            results[path] = LogResult(path, os.path.basename(path), entry[2], entry[3], st.st_mtime, 0.0, True)
+        else:
+            results[path] = None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for r in executor.map(scan_log, [p for p, r in results.items() if r is None]):
+            results[r.path] = r
+
+    # The stat taken before reading is recorded, a log written meanwhile is read again next time
+    cv_cache.save_json(index_path, {'version': LOG_INDEX_VERSION,
+                                    'root': os.path.abspath(root),
+                                    'logs': {p: stats[p] + [r.result, r.line] for p, r in results.items()}})
+    return list(results.values())
+
+def get_test_info(result, root):
+    '''Return the (cfg, test) of a log under results directory root laid out as
+       <cfg>/.../<simulator>-<test>.log'''
+    cfg = os.path.relpath(result.path, root).split(os.sep)[0]
+    test = os.path.splitext(result.name)[0]
+    return cfg, test.split('-', 1)[1] if '-' in test else test
+
+def glob_regex(pattern):
+    '''Regular expression of a glob with * and ? wildcards'''
+    return re.escape(str(pattern)).replace(r'\*', '[^\n]*').replace(r'\?', '[^\n]')
+
+class KnownFailures:
+    '''Expected failures of a core, read from a YAML file with a known_failures list.
+    Every entry has test, simulator and cfg globs (default: any) and an optional
+    signature regex that must also be found in the tail of the log. The globs of
+    all entries are compiled into a single regex, so a failure is matched in one pass.'''
+    def __init__(self, entries=()):
+        self.entries = []
+        self.regexes = []
+        for e in entries:
+            self.entries.append(dict(e, signature=re.compile(e['signature']) if e.get('signature') else None))
+            self.regexes.append('\n'.join(glob_regex(e.get(k, '*')) for k in ('simulator', 'cfg', 'test')))
+        self.combined = re.compile('|'.join('(?P<kf{}>{})'.format(i, r) for i, r in enumerate(self.regexes)))
+
+    @classmethod
+    def load(cls, path, defaults=()):
+        '''Read the known failures of path after the defaults entries, a missing file has none'''
+        if not os.path.exists(path):
+            return cls(defaults)
+        data = cv_yaml.load_file(path) or {}
+        return cls(list(defaults) + (data.get('known_failures') or []))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match(self, result, simulator, root):
+        '''Return the entry matching the failing LogResult result of simulator
+           under results directory root, or None'''
+        if not self.entries:
+            return None
+        key = '\n'.join((simulator,) + get_test_info(result, root))
+        m = self.combined.fullmatch(key)
+        if not m:
+            return None
+        entry = self.entries[int(m.lastgroup[2:])]
+        if not entry['signature']:
+            return entry
+        # An entry with a signature may not be the only one matching the test
+        tail = read_tail(result.path)
+        for entry, regex in zip(self.entries, self.regexes):
+            if re.fullmatch(regex, key) and (not entry['signature'] or entry['signature'].search(tail)):
+                return entry
+        return None
@@ -0,0 +1,306 @@
+################################################################################
+#
+# Copyright 2020 OpenHW Group
+#
+# Licensed under the Solderpad Hardware Licence, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://solderpad.org/licenses/
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier:Apache-2.0 WITH SHL-2.0
+#
+################################################################################
+
+import os
+import re
+import sys
+import time
+import errno
+import select
+import struct
+import fnmatch
+import logging
+import ctypes
+import ctypes.util
+from collections import OrderedDict
+
+import cv_logscan
+
+logger = logging.getLogger(__name__)
+
+# Verdict lines of the UVM (SIMULATION PASSED/FAILED) and CORE (EXIT SUCCESS/FAILURE) testbenches
+RESULT = re.compile(rb'SIMULATION (PASSED|FAILED)|EXIT (SUCCESS|FAILURE)')
+# UVM messages, not the "UVM_ERROR :    0" lines of the report summary
+UVM_MESSAGE = re.compile(rb'^\s*UVM_(ERROR|FATAL)\s+(?!:)')
+UVM_SUMMARY = re.compile(rb'^\s*UVM_(ERROR|FATAL)\s*:\s*(\d+)', re.MULTILINE)
+
+# Simulation logs are named <simulator>-<test>.log, unlike the compile and corev-dv
+# generator logs, except for the ldgen logs of the generator
+SIM_LOG_PATTERN = '{}-*.log'
+DEFAULT_EXCLUDE = ('trace_*', '*-ldgen.log')
+
+# inotify(7) event masks
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_Q_OVERFLOW  = 0x00004000
+IN_ISDIR       = 0x40000000
+WATCH_MASK     = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+class Inotify:
+    '''Minimal inotify(7) binding through the C library, raises OSError where not available'''
+    def __init__(self):
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            init = self.libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise OSError(errno.ENOSYS, 'inotify not available: {}'.format(e))
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1: {}'.format(os.strerror(ctypes.get_errno())))
+        self.watches = {}
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        '''Watch directory path, raises OSError e.g. when out of watches'''
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()), path)
+        self.watches[wd] = path
+
+    def read(self, timeout):
+        '''Wait up to timeout seconds for events, returns a list of (directory, mask, name)'''
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        i = 0
+        while i < len(data):
+            wd, mask, cookie, length = struct.unpack_from('iIII', data, i)
+            name = data[i + 16:i + 16 + length].rstrip(b'\0')
+            events.append((self.watches.get(wd), mask, os.fsdecode(name)))
+            i += 16 + length
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class LogTail:
+    '''Incremental parser of a growing simulation log: only the bytes appended
+    since the previous update are read, and none once the verdict is known'''
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.partial = b''
+        self.result = None
+        self.errors = 0
+        self.fatals = 0
+        self.finished = None
+
+    def settle(self):
+        '''Take the verdict of an already complete log from its end instead of
+           parsing it from the start, returns True if there is one'''
+        try:
+            size = os.stat(self.path).st_size
+            line = cv_logscan.find_banner(self.path)
+        except OSError:
+            return False
+        if not line:
+            return False
+        self.result = 'PASSED' if 'PASSED' in line else 'FAILED'
+        for severity, count in UVM_SUMMARY.findall(cv_logscan.read_tail(self.path).encode('utf-8')):
+            setattr(self, 'errors' if severity == b'ERROR' else 'fatals', int(count))
+        self.offset = size
+        self.finished = time.time()
+        return True
+
+    def update(self):
+        '''Parse what was appended to the log, returns True when this found the verdict'''
+        try:
+            size = os.stat(self.path).st_size
+        except OSError:
+            return False
+        if size < self.offset:
+            # Rewritten by a rerun of the test
+            self.__init__(self.path)
+        if self.result or size == self.offset:
+            return False
+
+        with open(self.path, 'rb') as fh:
+            fh.seek(self.offset)
+            data = fh.read(size - self.offset)
+        self.offset += len(data)
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        for line in lines:
+            if UVM_MESSAGE.match(line):
+                if b'UVM_ERROR' in line:
+                    self.errors += 1
+                else:
+                    self.fatals += 1
+            m = RESULT.search(line)
+            if m:
+                self.result = 'PASSED' if m.group(1) == b'PASSED' or m.group(2) == b'SUCCESS' else 'FAILED'
+                self.finished = time.time()
+                return True
+        return False
+
+class Monitor:
+    '''Follow the logs under result directories as they are written, with inotify
+    when available and by polling otherwise. Logs last written more than since
+    seconds before the monitor started are left from an earlier run: they are not
+    counted until they are written again. Other logs already complete when the
+    monitor starts are settled from their end, logs with a verdict are not read again.
+    Only the simulation logs of simulator are followed unless a pattern is given.'''
+    def __init__(self, roots, simulator='dsim', pattern=None, exclude=DEFAULT_EXCLUDE, expected=None, poll=False,
+                 since=0):
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.pattern = pattern or SIM_LOG_PATTERN.format(simulator)
+        self.exclude = exclude
+        self.expected = expected
+        self.logs = OrderedDict()
+        # (mtime, size) of the logs of an earlier run
+        self.stale = {}
+        self.dirty = set()
+        self.watched = set()
+        self.start = time.time()
+        self.since = self.start - since
+        self.inotify = None
+        if not poll:
+            try:
+                self.inotify = Inotify()
+            except OSError as e:
+                logger.info('Polling for changes, {}'.format(e))
+
+        for root in self.roots:
+            self.discover(root, settle=True)
+        self.at_start = self.completed()
+
+    @property
+    def mode(self):
+        return 'inotify' if self.inotify else 'polling'
+
+    def is_log(self, name):
+        return fnmatch.fnmatch(name, self.pattern) and not any(fnmatch.fnmatch(name, e) for e in self.exclude)
+
+    def add_log(self, path, settle=False):
+        if path in self.logs:
+            self.dirty.add(path)
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        if path in self.stale:
+            if self.stale[path] == (st.st_mtime_ns, st.st_size):
+                return
+            # Rewritten by this run, parsed from the start
+            del self.stale[path]
+            settle = False
+        elif settle and st.st_mtime < self.since:
+            self.stale[path] = (st.st_mtime_ns, st.st_size)
+            return
+        tail = LogTail(path)
+        self.logs[path] = tail
+        if not (settle and tail.settle()):
+            self.dirty.add(path)
+
+    def discover(self, root, settle=False):
+        '''Walk a (new) directory for logs, and watch its directories'''
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            if self.inotify and dirpath not in self.watched:
+                try:
+                    self.inotify.add_watch(dirpath)
+                    self.watched.add(dirpath)
+                except OSError as e:
+                    logger.info('Polling for changes, cannot watch {}: {}'.format(dirpath, e))
+                    self.inotify.close()
+                    self.inotify = None
+            for f in sorted(filenames):
+                if self.is_log(f):
+                    self.add_log(os.path.join(dirpath, f), settle)
+
+    def update(self, timeout):
+        '''Wait up to timeout seconds for changes, returns the LogTails that got their verdict'''
+        if self.inotify:
+            for root in self.roots:
+                if root not in self.watched and os.path.isdir(root):
+                    self.discover(root)
+            for directory, mask, name in self.inotify.read(timeout):
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost, fall back to a stat of every log
+                    for root in self.roots:
+                        self.discover(root)
+                    self.dirty.update(p for p, t in self.logs.items() if not t.result)
+                elif directory is None:
+                    continue
+                elif mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self.discover(os.path.join(directory, name))
+                elif self.is_log(name):
+                    self.add_log(os.path.join(directory, name))
+        else:
+            time.sleep(timeout)
+            for root in self.roots:
+                self.discover(root)
+            # A rerun rewrites the log of a completed test, which a stat detects
+            # (logs of an earlier run are stat'ed by discover())
+            self.dirty.update(self.logs)
+
+        finished = []
+        for path in sorted(self.dirty):
+            if self.logs[path].update():
+                finished.append(self.logs[path])
+        self.dirty.clear()
+        return finished
+
+    def completed(self):
+        return len([t for t in self.logs.values() if t.result])
+
+    def status(self):
+        '''One line summary of the progress'''
+        passed = len([t for t in self.logs.values() if t.result == 'PASSED'])
+        failed = len([t for t in self.logs.values() if t.result == 'FAILED'])
+        elapsed = time.time() - self.start
+        rate = (passed + failed - self.at_start) / elapsed * 60 if elapsed else 0
+        line = 'Passed: {} Failed: {} Running: {}'.format(passed, failed, len(self.logs) - passed - failed)
+        if self.expected:
+            line += ' of {}'.format(self.expected)
+        line += ' ({:.1f}/min'.format(rate)
+        if self.expected and rate:
+            line += ', ETA {}'.format(time.strftime('%H:%M:%S', time.gmtime(max(0, self.expected - passed - failed)
+                                                                              / rate * 60)))
+        return line + ')'
+
+    def follow(self, interval=2.0, verbose=False, out=sys.stdout):
+        '''Print verdicts and progress until the expected number of logs completed
+           (or forever), returns the number of failed logs'''
+        out.write('Following {} logs under {} ({}), ignoring {} logs of an earlier run\n'.format(
+                  len(self.logs), ', '.join(self.roots), self.mode, len(self.stale)))
+        out.write(self.status() + '\n')
+        try:
+            while not (self.expected and self.completed() >= self.expected):
+                logs = len(self.logs)
+                finished = self.update(interval)
+                for t in finished:
+                    if t.result == 'FAILED' or verbose:
+                        out.write('{}: {} (UVM_ERROR: {}, UVM_FATAL: {})\n'.format(t.result, t.path, t.errors,
+                                                                                   t.fatals))
+                # Progress is printed when a log started or finished
+                if finished or len(self.logs) != logs:
+                    out.write(self.status() + '\n')
+                out.flush()
+        except KeyboardInterrupt:
+            out.write(self.status() + '\n')
+        return len([t for t in self.logs.values() if t.result == 'FAILED'])
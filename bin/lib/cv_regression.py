@@ -21,8 +21,15 @@
 import os
 import re
 import sys
+import json
+import time
+import hashlib
 import logging
-from collections import OrderedDict
+import subprocess
+import concurrent.futures
+from collections import OrderedDict, deque
+
+import cv_cache
 
 logger = logging.getLogger(__name__)
 
@@ -32,11 +39,466 @@ DEFAULT_CFG = 'default'
 DEFAULT_SIMULATION_PASSED = 'SIMULATION PASSED'
 DEFAULT_SIMULATION_FAILED = 'SIMULATION FAILED'
 DEFAULT_SKIP_SIM = []
+TEST_PROGRAM_DIRS = ('tests/programs/corev-dv', 'tests/programs/custom', 'tests/programs/embench')
+COMPLIANCE_PASSED = 'All signatures passed'
+
+JOB_CACHE_VERSION = 3
+JOB_CACHE_ENTRIES = 20000
+RUNTIME_HISTORY_VERSION = 1
+
+# Run times kept per test and the percentile used to estimate the next run
+RUNTIME_SAMPLES = 20
+RUNTIME_PERCENTILE = 90
+
+# Prefix of the files in a build output directory holding the key of the build
+# that last wrote it, one per build name as builds of a cfg share the directory
+BUILD_STAMP = '.cv_build_key'
+
+# Number of trailing output lines (and bytes of log file) searched for PASS/FAIL
+TAIL_LINES = 200
+TAIL_BYTES = 64 * 1024
 
 def get_proj_root():
     '''Fetch absolute path of core-v-verif directory'''
     return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 
+def yesorno(val):
+    '''Make flag value of a YES/NO setting, as the yesorno macro of the templates'''
+    if val == '0':
+        return 'NO'
+    if val == '1' or val is True:
+        return 'YES'
+    return '' if val is None else str(val)
+
+def cv_results(results):
+    '''CV_RESULTS make argument, as the cv_results macro of the templates'''
+    return 'CV_RESULTS={}'.format(results) if results else ''
+
+def read_tail(path):
+    '''Return the last TAIL_BYTES of a file, or an empty string if it does not exist'''
+    try:
+        with open(path, 'rb') as fh:
+            fh.seek(0, os.SEEK_END)
+            fh.seek(max(0, fh.tell() - TAIL_BYTES))
+            return fh.read().decode('utf-8', errors='replace')
+    except OSError:
+        return ''
+
+def get_source_state(paths, exclude=()):
+    '''Fingerprint of the sources in the git checkouts at paths: the HEAD commit and
+    uncommitted changes to tracked files, except those matching the exclude globs.
+    A missing path changes the fingerprint.'''
+    state = hashlib.sha1()
+    pathspec = ['--', '.'] + [':(exclude,glob){}'.format(e) for e in exclude]
+    for path in paths:
+        state.update(path.encode('utf-8'))
+        if not os.path.isdir(path):
+            continue
+        for cmd in (['git', 'rev-parse', 'HEAD'], ['git', 'diff', 'HEAD'] + pathspec):
+            try:
+                state.update(subprocess.run(cmd, cwd=path, stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL, check=True).stdout)
+            except (OSError, subprocess.CalledProcessError):
+                break
+    return state.hexdigest()
+
+def get_tree_hash(paths):
+    '''Hash of the names and contents of all files in (or at) paths'''
+    tree = hashlib.sha1()
+    for path in paths:
+        tree.update(path.encode('utf-8') + b'\0')
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = sorted(os.path.join(d, f) for d, _, fs in os.walk(path) for f in fs)
+        for f in files:
+            try:
+                with open(f, 'rb') as fh:
+                    tree.update(os.path.relpath(f, path).encode('utf-8') + b'\0' + fh.read())
+            except OSError:
+                pass
+    return tree.hexdigest()
+
+def read_stamp(stamp):
+    '''Key recorded in stamp file, empty if unknown'''
+    try:
+        with open(stamp) as fh:
+            return fh.read().strip()
+    except OSError:
+        return ''
+
+def write_stamp(stamp, key):
+    '''Record key in stamp file, or remove it if None. The stamp is only written
+    if its build output directory exists, i.e. the build actually wrote it.'''
+    if key is None:
+        try:
+            os.remove(stamp)
+        except OSError:
+            pass
+        return
+    if not os.path.isdir(os.path.dirname(stamp)):
+        logger.warning('Build output {} not found, not reused'.format(os.path.dirname(stamp)))
+        return
+    with open(stamp, 'w') as fh:
+        fh.write(key + '\n')
+
+def has_build_output(output):
+    '''True if the build output directory holds anything besides the build stamps'''
+    try:
+        return any(not f.startswith(BUILD_STAMP) for f in os.listdir(output))
+    except OSError:
+        return False
+
+class JobCache:
+    '''Manifest of jobs that passed in the user cache directory, keyed by a
+    fingerprint of their inputs (Build.get_key(), Test.get_key()).
+    An entry is only used while the job output (build directory or simulation
+    log) exists and was last written by the job of that key: builds with other
+    keys (e.g. other make arguments) share the output directory of a cfg, so
+    each build stamps it with its key (see Build.get_stamp()). Other outputs
+    (simulation logs) are only used while not modified since they were recorded.'''
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cv_cache.get_cache_dir('jobs'), 'manifest.json')
+        manifest = cv_cache.load_json(self.path, {})
+        if manifest.get('version') != JOB_CACHE_VERSION:
+            manifest = {'version': JOB_CACHE_VERSION, 'jobs': {}}
+        self.manifest = manifest
+        self.removed = set()
+
+    def lookup(self, key):
+        '''Return the manifest entry of key if its output is still present'''
+        entry = self.manifest['jobs'].get(key)
+        if not entry or not os.path.exists(entry['output']):
+            return None
+        if entry.get('stamp') and (read_stamp(entry['stamp']) != key or not has_build_output(entry['output'])):
+            return None
+        if not entry.get('stamp') and os.path.getmtime(entry['output']) != entry.get('mtime'):
+            return None
+        return entry
+
+    def record(self, key, job):
+        '''Record a job that passed'''
+        self.manifest['jobs'][key] = {'name': job.name,
+                                      'cmd': job.cmd,
+                                      'dir': job.cwd,
+                                      'output': job.output,
+                                      'stamp': job.stamp,
+                                      'mtime': os.path.getmtime(job.output) if os.path.isfile(job.output) else None,
+                                      'time': time.time()}
+        self.removed.discard(key)
+
+    def remove(self, key):
+        '''Forget a job that failed or is about to run again'''
+        self.manifest['jobs'].pop(key, None)
+        self.removed.add(key)
+
+    def save(self):
+        '''Merge into the manifest on disk, which other regressions may have updated,
+        keeping the JOB_CACHE_ENTRIES most recent entries'''
+        manifest = cv_cache.load_json(self.path, {})
+        if manifest.get('version') == JOB_CACHE_VERSION:
+            manifest['jobs'].update(self.manifest['jobs'])
+            for key in self.removed:
+                manifest['jobs'].pop(key, None)
+            self.manifest = manifest
+        if len(self.manifest['jobs']) > JOB_CACHE_ENTRIES:
+            newest = sorted(self.manifest['jobs'].items(), key=lambda e: e[1]['time'])[-JOB_CACHE_ENTRIES:]
+            self.manifest['jobs'] = dict(newest)
+        cv_cache.save_json(self.path, self.manifest)
+
+class RuntimeHistory:
+    '''Durations of past runs in the user cache directory, keyed by project,
+    test (or build), build, cfg and simulator, see key()'''
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cv_cache.get_cache_dir(), 'runtime_history.json')
+        data = cv_cache.load_json(self.path, {})
+        self.runtimes = data.get('runtimes', {}) if data.get('version') == RUNTIME_HISTORY_VERSION else {}
+        self.updates = {}
+        self.default = None
+
+    @staticmethod
+    def key(project, name, build, cfg, simulator):
+        '''History key of a test (or build) run'''
+        return '/'.join((project, name, build, cfg, simulator))
+
+    def add(self, key, duration):
+        '''Record the duration in seconds of a run'''
+        self.updates.setdefault(key, []).append(round(duration, 3))
+
+    def percentile(self, key, p=RUNTIME_PERCENTILE):
+        '''Nearest-rank percentile of the recorded durations of key, None if unknown'''
+        samples = sorted(self.runtimes.get(key, []))
+        if not samples:
+            return None
+        return samples[max(0, -(-len(samples) * p // 100) - 1)]
+
+    def estimate(self, key):
+        '''Expected duration of a run of key. Runs without history are assumed
+        to take the median of the estimates of all runs with history.'''
+        estimate = self.percentile(key)
+        if estimate is not None:
+            return estimate
+        if self.default is None:
+            known = sorted(self.percentile(k) for k in self.runtimes)
+            self.default = known[len(known) // 2] if known else 0
+        return self.default
+
+    def load_results(self, path):
+        '''Add the durations of the jobs in a JSON results summary of run_jobs()'''
+        results = cv_cache.load_json(path, {})
+        count = 0
+        for job in results.get('jobs', []):
+            if job.get('history_key') and job.get('returncode') is not None:
+                self.add(job['history_key'], job['duration'])
+                count += 1
+        logger.info('Read {} run times from: {}'.format(count, path))
+
+    def load_runtimes(self, path):
+        '''Add the durations recorded by the --sh and --mk scripts, a line
+        "<key> <milliseconds>" per build and test run'''
+        count = 0
+        try:
+            with open(path) as fh:
+                for line in fh:
+                    fields = line.split()
+                    if len(fields) == 2 and fields[1].isdigit():
+                        self.add(fields[0], int(fields[1]) / 1000.0)
+                        count += 1
+        except OSError as e:
+            logger.warning('Cannot read run times: {}'.format(e))
+        logger.info('Read {} run times from: {}'.format(count, path))
+
+    def save(self):
+        '''Merge the new durations into the history on disk'''
+        if not self.updates:
+            return
+        data = cv_cache.load_json(self.path, {})
+        runtimes = data.get('runtimes', {}) if data.get('version') == RUNTIME_HISTORY_VERSION else {}
+        for key, durations in self.updates.items():
+            runtimes[key] = (runtimes.get(key, []) + durations)[-RUNTIME_SAMPLES:]
+        cv_cache.save_json(self.path, {'version': RUNTIME_HISTORY_VERSION, 'runtimes': runtimes})
+        self.runtimes = runtimes
+        self.updates = {}
+
+def get_priorities(jobs):
+    '''Priority of each job for longest-first scheduling: its estimated duration
+    plus the largest priority of the jobs depending on it (the critical path)'''
+    priorities = {}
+    dependents = {}
+    for job in jobs:
+        for d in job.deps + job.after:
+            dependents.setdefault(d, []).append(job)
+    # Dependencies come before the jobs depending on them
+    for job in reversed(jobs):
+        priorities[job] = job.estimate + max((priorities.get(d, 0) for d in dependents.get(job, [])), default=0)
+    return priorities
+
+class Job:
+    '''A command of a regression run and the jobs it depends on.
+    checks is a list of (log file, pass string) pairs that all need to pass,
+    the tail of the command output is searched as well as the log file.
+    The job waits for the jobs in after to finish as well, whether they pass or not.'''
+    def __init__(self, name, kind, cmd, cwd, deps=None, checks=None, failed=None, cache_key=None, output=None,
+                 reuse=True, history_key=None, estimate=0, parent=None, run_index=None, seed=None,
+                 stamp=None, build_stamps=None, after=None):
+        self.name = name
+        self.kind = kind
+        self.cmd = cmd
+        self.cwd = cwd
+        self.deps = deps or []
+        self.after = after or []
+        self.checks = checks or []
+        self.failed = failed
+        # Passing jobs are recorded in the JobCache under cache_key, and not
+        # run again while recorded if reuse is set
+        self.cache_key = cache_key
+        self.output = output
+        self.reuse = reuse
+        # A build records its cache_key in the stamp file in its output directory,
+        # a test folds the build_stamps of the builds it runs on into its cache_key
+        self.stamp = stamp
+        self.build_stamps = build_stamps or []
+        self.history_key = history_key
+        self.estimate = estimate
+        # Test iterations (shards) aggregate under their parent test in the summary
+        self.parent = parent
+        self.run_index = run_index
+        self.seed = seed
+        self.status = None
+        self.reason = None
+        self.returncode = None
+        self.log = None
+        self.duration = 0.0
+
+    def run(self, log_dir, env=None):
+        '''Run the command, streaming its output to a log in log_dir'''
+        self.log = os.path.join(log_dir, self.name + '.log')
+        tail = deque(maxlen=TAIL_LINES)
+        start = time.time()
+        logger.debug('{}: running [cd {} && {}]'.format(self.name, self.cwd, self.cmd))
+        with open(self.log, 'w') as log_fh:
+            try:
+                proc = subprocess.Popen(self.cmd, shell=True, cwd=self.cwd, env=env,
+                                        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, universal_newlines=True,
+                                        errors='replace')
+            except OSError as e:
+                log_fh.write('{}\n'.format(e))
+                self.returncode = -1
+            else:
+                for line in proc.stdout:
+                    log_fh.write(line)
+                    log_fh.flush()
+                    tail.append(line)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug('{}: {}'.format(self.name, line.rstrip()))
+                self.returncode = proc.wait()
+        self.duration = time.time() - start
+
+        if not self.checks:
+            self.status = 'PASSED' if self.returncode == 0 else 'FAILED'
+            if self.returncode != 0:
+                self.reason = 'exit status {}'.format(self.returncode)
+            return self
+
+        output = ''.join(tail)
+        self.status = 'PASSED'
+        for path, passed in self.checks:
+            text = output if passed in output else read_tail(path)
+            if passed not in text or (self.failed and self.failed in text):
+                self.status = 'FAILED'
+                self.reason = '"{}" not found in {}'.format(passed, path) if passed not in text \
+                              else '"{}" found in {}'.format(self.failed, path)
+                break
+        return self
+
+    def summary(self):
+        '''Dictionary of the job for the JSON results summary'''
+        return OrderedDict([('name', self.name),
+                            ('kind', self.kind),
+                            ('cmd', self.cmd),
+                            ('dir', self.cwd),
+                            ('deps', [d.name for d in self.deps]),
+                            ('after', [d.name for d in self.after]),
+                            ('status', self.status),
+                            ('reason', self.reason),
+                            ('returncode', self.returncode),
+                            ('duration', round(self.duration, 3)),
+                            ('log', self.log),
+                            ('history_key', self.history_key),
+                            ('parent', self.parent),
+                            ('run_index', self.run_index),
+                            ('seed', self.seed),
+                            ('checks', [c[0] for c in self.checks])])
+
+def run_jobs(jobs, workers=1, log_dir='.', summary=None, env=None, cache=None, history=None):
+    '''Run jobs on a pool of workers, starting each job once all its dependencies
+    passed. Jobs whose dependencies failed are not run and count as failed.
+    Jobs to reuse with a cache_key found in the JobCache cache are not run either.
+    Free workers take the ready job with the longest estimated critical path first,
+    the durations of jobs with a history_key are added to the RuntimeHistory history.
+    Returns the results summary, which is also written as JSON to summary if given.'''
+    log_dir = os.path.abspath(log_dir)
+    os.makedirs(log_dir, exist_ok=True)
+    workers = max(1, int(workers))
+    priorities = get_priorities(jobs)
+    pending = sorted(jobs, key=lambda j: priorities[j], reverse=True)
+    running = {}
+    start = time.time()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for job in list(pending):
+                if len(running) >= workers:
+                    break
+                if not all(d.status for d in job.deps + job.after):
+                    continue
+                pending.remove(job)
+                failed_deps = [d.name for d in job.deps if d.status != 'PASSED']
+                if failed_deps:
+                    job.status = 'FAILED'
+                    job.reason = 'dependency failed: {}'.format(', '.join(failed_deps))
+                    logger.info('{} {}: {} ({})'.format(job.kind.capitalize(), job.status, job.name, job.reason))
+                    continue
+                if job.cache_key and job.build_stamps:
+                    # The builds a test runs on are only known once they are done
+                    job.cache_key = hashlib.sha1('\0'.join([job.cache_key] + [read_stamp(s) for s in job.build_stamps])
+                                                 .encode('utf-8')).hexdigest()
+                    job.build_stamps = []
+                if cache and job.cache_key and job.reuse and cache.lookup(job.cache_key):
+                    job.status = 'PASSED'
+                    job.reason = 'cached'
+                    logger.info('{} {}: {} (cached, output in {})'.format(job.kind.capitalize(), job.status,
+                                                                          job.name, job.output))
+                    continue
+                if cache and job.cache_key:
+                    cache.remove(job.cache_key)
+                if job.stamp:
+                    write_stamp(job.stamp, None)
+                running[pool.submit(job.run, log_dir, env)] = job
+
+            if not running:
+                continue
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for f in done:
+                job = running.pop(f)
+                f.result()
+                if job.stamp and job.cache_key and job.status == 'PASSED':
+                    write_stamp(job.stamp, job.cache_key)
+                if cache and job.cache_key:
+                    if job.status == 'PASSED':
+                        cache.record(job.cache_key, job)
+                    else:
+                        cache.remove(job.cache_key)
+                if history is not None and job.history_key:
+                    history.add(job.history_key, job.duration)
+                logger.info('{} {}: {} ({:.1f}s) Log: {}'.format(job.kind.capitalize(), job.status,
+                                                                 job.name, job.duration, job.log))
+
+    if cache:
+        cache.save()
+    if history is not None:
+        history.save()
+
+    results = OrderedDict()
+    results['workers'] = workers
+    results['wall_time'] = round(time.time() - start, 3)
+    results['job_time'] = round(sum(j.duration for j in jobs), 3)
+    for kind in ('build', 'test'):
+        results['{}s_passed'.format(kind)] = len([j for j in jobs if j.kind == kind and j.status == 'PASSED'])
+        results['{}s_failed'.format(kind)] = len([j for j in jobs if j.kind == kind and j.status != 'PASSED'])
+    results['tests'] = OrderedDict()
+    for j in jobs:
+        if j.parent:
+            test = results['tests'].setdefault(j.parent, OrderedDict([('status', 'PASSED'),
+                                                                      ('passed', 0),
+                                                                      ('failed', 0),
+                                                                      ('failed_seeds', [])]))
+            if j.status == 'PASSED':
+                test['passed'] += 1
+            else:
+                test['status'] = 'FAILED'
+                test['failed'] += 1
+                test['failed_seeds'].append(j.seed)
+    results['jobs'] = [j.summary() for j in jobs]
+
+    if summary:
+        with open(summary, 'w') as fh:
+            json.dump(results, fh, indent=4)
+        logger.info('Wrote results summary: {}'.format(summary))
+
+    return results
+
+def order_builds(builds):
+    '''Builds sharing a directory share the make targets that clone the RTL and
+    the generators, so they run one after another: set Build.after of each build
+    to the build before it in the same directory'''
+    last = {}
+    for b in builds:
+        b.after = last.get(b.abs_dir)
+        last[b.abs_dir] = b.name
+
 class Build:
     '''A regression build object'''
     def __init__(self, **kwargs):
@@ -51,6 +513,11 @@ class Build:
         # Absolutize a directory if dir tag exists
         self.abs_dir = os.path.abspath(os.path.join(get_proj_root(), self.dir))
 
+        # Name of the build that is run in place of this one, see get_key()
+        self.canonical = self.name
+        # Name of the build run before this one in the same directory, see order_builds()
+        self.after = None
+
     def set_cov(self):
         '''Set the coverage flag based on app setting.
         If cov already defined (from testlist), then ignore'''
@@ -63,6 +530,27 @@ class Build:
         '''In the command substitute the make with the supplied substitution'''
         self.cmd = re.sub('make', make_sub, self.cmd)
 
+    def get_key(self, project, results=None, makeargs='', source_state=''):
+        '''Identity of the build: builds with the same key produce the same output'''
+        return hashlib.sha1('\0'.join((self.abs_dir,
+                                        ' '.join(self.get_cmd(project, results, makeargs).split()),
+                                        source_state)).encode('utf-8')).hexdigest()
+
+    def get_output(self, results=None):
+        '''Directory holding the compiled build'''
+        if results:
+            return os.path.join(self.abs_dir, results, self.simulator + '_results', self.cfg)
+        return os.path.join(self.abs_dir, self.simulator + '_results', self.cfg)
+
+    def get_stamp(self, results=None):
+        '''File in the build output directory holding the key of this build, see write_stamp()'''
+        return os.path.join(self.get_output(results), '{}.{}'.format(BUILD_STAMP, self.name))
+
+    def get_cmd(self, project, results=None, makeargs=''):
+        '''Build command line, as rendered into the regression scripts'''
+        return ' '.join((self.cmd, 'CV_CORE=' + project, 'CFG=' + self.cfg, 'SIMULATOR=' + self.simulator,
+                         'COV=' + yesorno(getattr(self, 'cov', None)), cv_results(results), makeargs))
+
     def __str__(self):
         return '{} {} {}'.format(self.name, self.cmd, self.dir)
 
@@ -78,6 +566,8 @@ class Test:
         self.iss = DEFAULT_ISS
         self.num = 1
         self.builds = []
+        # Expected duration in seconds, longer tests are scheduled first
+        self.runtime = 0
 
         for k, v in kwargs.items():
             setattr(self, k, v)
@@ -106,6 +596,79 @@ class Test:
             # precmd is optional
             pass
 
+    def get_precmd(self, project, cfg, toolchain, results=None, makeargs=''):
+        '''Precommand line (e.g. generation of all iterations), None if not defined'''
+        if not getattr(self, 'precmd', None):
+            return None
+        return ' '.join((self.precmd, 'CV_CORE=' + project, 'CFG=' + cfg, toolchain.upper() + '=1',
+                         'SIMULATOR=' + self.simulator, 'SEED=random', 'GEN_NUM_TESTS={}'.format(self.num),
+                         cv_results(results), makeargs, getattr(self, 'makearg', '')))
+
+    def get_seed(self, run_index, base_seed=None):
+        '''Seed of one iteration, derived from the regression base seed so that
+        every iteration (shard) of every test gets its own reproducible seed.
+        Without a base seed the seed is picked at run time.'''
+        if base_seed is None:
+            return 'random'
+        digest = hashlib.sha1('{}/{}/{}'.format(base_seed, self.name, run_index).encode('utf-8')).hexdigest()
+        return int(digest[:8], 16) & 0x7fffffff or 1
+
+    def get_seeds(self, base_seed=None):
+        '''Seeds of all iterations'''
+        return [self.get_seed(i, base_seed) for i in range(int(self.num))]
+
+    def get_cmd(self, project, cfg, toolchain, run_index, results=None, makeargs='', seed='random'):
+        '''Test command line for one iteration'''
+        return ' '.join((self.cmd, 'CV_CORE=' + project, 'CFG=' + cfg, toolchain.upper() + '=1',
+                         'SIMULATOR=' + self.simulator, 'COMP=0', 'USE_ISS=' + yesorno(self.iss),
+                         'COV=' + yesorno(getattr(self, 'cov', None)), 'SEED={}'.format(seed),
+                         'GEN_START_INDEX={}'.format(run_index), 'RUN_INDEX={}'.format(run_index),
+                         cv_results(results), makeargs, getattr(self, 'makearg', '')))
+
+    def get_program_dir(self, project):
+        '''Directory of the test program and test.yaml named by TEST= of the command'''
+        m = re.search(r'\bTEST=(\S+)', self.cmd)
+        program = m.group(1) if m else self.name
+        for d in TEST_PROGRAM_DIRS:
+            path = os.path.join(get_proj_root(), project, d, program)
+            if os.path.isdir(path):
+                return path
+        return None
+
+    def get_fingerprint(self, project, cfg, build_key):
+        '''Fingerprint of the inputs of the test: the build, the test program
+        sources and test.yaml and the cfg YAML, see get_key()'''
+        program_dir = self.get_program_dir(project)
+        cfg_yaml = os.path.join(get_proj_root(), project, 'tests', 'cfg', cfg + '.yaml')
+        return hashlib.sha1('\0'.join((build_key, self.simulation_passed,
+                                        get_tree_hash([p for p in (program_dir, cfg_yaml) if p])))
+                            .encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get_key(fingerprint, cmd):
+        '''Key of one iteration in the JobCache: the test fingerprint and its command
+        (without seed). The keys stamped by its builds are added when it is run, see Job.'''
+        return hashlib.sha1('\0'.join((fingerprint, cmd)).encode('utf-8')).hexdigest()
+
+    def get_results_dir(self, cfg, run_index, results=None):
+        '''Directory of the simulation results of one iteration'''
+        results_dir = os.path.join(self.abs_dir, results, self.simulator + '_results') if results \
+                      else os.path.join(self.abs_dir, self.simulator + '_results')
+        return os.path.join(results_dir, cfg, getattr(self, 'results', None) or self.log, str(run_index))
+
+    def get_log(self, cfg, run_index, results=None):
+        '''Simulation log of one iteration'''
+        return os.path.join(self.get_results_dir(cfg, run_index, results),
+                            '{}-{}.log'.format(self.simulator, self.log))
+
+    def get_checks(self, cfg, run_index, results=None):
+        '''Logs and strings that must be found in them for the iteration to pass'''
+        checks = [(self.get_log(cfg, run_index, results), self.simulation_passed)]
+        if 'compliance' in self.cmd:
+            checks.append((os.path.join(self.get_results_dir(cfg, run_index, results), 'diff_signatures.log'),
+                           COMPLIANCE_PASSED))
+        return checks
+
 class Regression:
     '''A full regression object'''
     def __init__(self, **kwargs):
@@ -164,8 +727,86 @@ class Regression:
 
         return builds_with_no_tests
 
+    def get_build_group(self, build):
+        '''Names of the (canonical) builds a test of build needs: all builds of its
+        directory and cfg, e.g. the corev-dv generator build along with the testbench'''
+        b = self.builds[build]
+        return list(OrderedDict.fromkeys([b.canonical] + [o.canonical for o in self.builds.values()
+                                                          if o.abs_dir == b.abs_dir and o.cfg == b.cfg]))
+
     def get_tests_of_build(self, build):
         '''Return all test objects that contain the given build'''
 
         tests = [t for t in self.tests.values() if build in t.builds]
-        return tests
+        return sorted(tests, key=lambda t: t.runtime, reverse=True)
+
+    def get_jobs(self, project, toolchain, results=None, makeargs='', build_jobs=None, deps=None,
+                 source_state=None, history=None, seed=None, reuse_builds=True, incremental=False):
+        '''Return the jobs to run this regression: each build, and each test iteration
+        depending on the builds of its directory (and precommand). build_jobs maps build names to jobs
+        already created, so builds shared by regressions (or identical to a build
+        already created, see Build.canonical) run once. All builds depend on deps.
+        With a source_state, build jobs get a key for the JobCache and unchanged
+        builds are reused if reuse_builds; if incremental, test jobs get one too
+        and iterations that passed with unchanged inputs are reused. With a RuntimeHistory, jobs get its
+        estimate of their duration. Each test iteration is a separate job with
+        its own seed, see Test.get_seed().'''
+        if build_jobs is None:
+            build_jobs = OrderedDict()
+        jobs = []
+
+        for b in self.builds.values():
+            if b.name in build_jobs:
+                continue
+            if b.canonical in build_jobs:
+                build_jobs[b.name] = build_jobs[b.canonical]
+                continue
+            # Builds sharing a directory run one after another, see order_builds()
+            after = [build_jobs[b.after]] if b.after in build_jobs else []
+            build_jobs[b.name] = Job('build.' + b.name, 'build', b.get_cmd(project, results, makeargs),
+                                     b.abs_dir, deps=list(deps or []), after=after,
+                                     cache_key=None if source_state is None else
+                                               b.get_key(project, results, makeargs, source_state),
+                                     output=b.get_output(results), reuse=reuse_builds, stamp=b.get_stamp(results),
+                                     history_key=RuntimeHistory.key(project, 'build', b.name, b.cfg, b.simulator))
+            if history:
+                build_jobs[b.name].estimate = history.estimate(build_jobs[b.name].history_key)
+            jobs.append(build_jobs[b.name])
+
+        for t in sorted(self.tests.values(), key=lambda t: t.name):
+            for build in t.builds:
+                cfg = self.builds[build].cfg
+                name = '.'.join((self.name, t.name, build))
+                # A test needs all builds of its directory and cfg, e.g. the corev-dv generator
+                build_deps = [build_jobs[d] for d in self.get_build_group(build)]
+                test_deps = list(build_deps)
+                precmd = t.get_precmd(project, cfg, toolchain, results, makeargs)
+                if precmd:
+                    test_deps.append(Job('precmd.' + name, 'precmd', precmd, t.abs_dir, deps=list(build_deps)))
+                    jobs.append(test_deps[-1])
+
+                history_key = RuntimeHistory.key(project, t.name, build, cfg, t.simulator)
+                build_key = build_jobs[build].cache_key
+                # Hashing the test program is only worth it to skip passed iterations
+                fingerprint = t.get_fingerprint(project, cfg, build_key) \
+                              if incremental and build_key is not None else None
+                for run_index, test_seed in enumerate(t.get_seeds(seed)):
+                    checks = t.get_checks(cfg, run_index, results)
+                    jobs.append(Job('test.{}.{}'.format(name, run_index), 'test',
+                                    t.get_cmd(project, cfg, toolchain, run_index, results, makeargs, test_seed),
+                                    t.abs_dir, deps=test_deps, checks=checks,
+                                    failed=t.simulation_failed,
+                                    cache_key=None if fingerprint is None else
+                                              t.get_key(fingerprint, t.get_cmd(project, cfg, toolchain, run_index,
+                                                                               results, makeargs, '')),
+                                    output=checks[0][0], reuse=incremental,
+                                    build_stamps=[d.stamp for d in build_deps],
+                                    history_key=history_key,
+                                    estimate=history.estimate(history_key) if history else 0,
+                                    parent=name, run_index=run_index, seed=test_seed))
+
+        return jobs
+
+    def run(self, workers=1, log_dir='.', summary=None, env=None, cache=None, history=None, **kwargs):
+        '''Run this regression on a pool of workers, see get_jobs() and run_jobs()'''
+        return run_jobs(self.get_jobs(history=history, **kwargs), workers, log_dir, summary, env, cache, history)
@@ -0,0 +1,39 @@
+################################################################################
+#
+# Copyright 2020 OpenHW Group
+#
+# Licensed under the Solderpad Hardware Licence, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://solderpad.org/licenses/
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier:Apache-2.0 WITH SHL-2.0
+#
+################################################################################
+
+import yaml
+
+# Use the libyaml (C) loader when PyYAML was built with it, the regression
+# lists and test specifications are plain data so the safe loader suffices
+try:
+    Loader = yaml.CSafeLoader
+    BACKEND = 'libyaml (CSafeLoader)'
+except AttributeError:
+    Loader = yaml.SafeLoader
+    BACKEND = 'pure Python (SafeLoader)'
+
+def load(stream):
+    '''Parse a YAML document from a stream or string'''
+    return yaml.load(stream, Loader=Loader)
+
+def load_file(path):
+    '''Parse the YAML document in path'''
+    with open(path, 'r') as fh:
+        return load(fh)
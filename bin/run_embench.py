@@ -41,11 +41,27 @@ import subprocess
 import jinja2
 import glob
 import re
+import json
+import shutil
+import signal
+import time
+import hashlib
+import concurrent.futures
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'lib'))
+
+import cv_cache
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('run_embench')
 
+# Run with benchmark_speed.py arguments after a JSON file of the elapsed times of run_speed_jobs():
+# benchmark_speed.py scores the times its benchmark_speed() would have measured
+SCORE_SPEED = ('import sys, json, benchmark_speed; times = json.load(open(sys.argv.pop(1))); '
+               'benchmark_speed.benchmark_speed = lambda bench, target_args: times.get(bench, 0.0); '
+               'sys.exit(benchmark_speed.main())')
+
 def main():
 
   check_python_version(3,6)
@@ -85,23 +101,32 @@ def main():
     logger.info(f"Invalid 'build_only' option: {args.build_only}, must be 'YES' or 'NO'")
     sys.exit(1)
 
+  if args.compile not in ('YES', 'NO'):
+    logger.info(f"Invalid 'compile' option: {args.compile}, must be 'YES' or 'NO'")
+    sys.exit(1)
+
   logger.info("Starting EMBench for core-v-verif")
   logger.info(f"Benchmarking core: {args.core}")
   logger.info(f"Type of benchmark to run: {args.type}\n\n")
 
+  # Files staged by previous runs, unchanged ones are not copied again
+  manifest_path = os.path.join(cv_cache.get_cache_dir('embench'),
+                               f"{args.core}-{cv_cache.get_checkout_id()}.json")
+  manifest = cv_cache.load_json(manifest_path, {})
+  times = {'staging': 0.0, 'build': 0.0, 'run': 0.0}
+  start = time.time()
+
   # checking if there are existing configuration files
   if os.path.exists(paths['emcfg']):
     logger.info("EMBench repository checked out previously")
     logger.info("Cleaning results and skipping cfg copy")
     prebuilt = True
-    # deleting existing build results
+    # deleting existing build results, the speed test directories are
+    # refreshed (and stale ones removed) once the benchmarks are built
     try:
-      subprocess.run(
-        ['find', '.', '!', '-path', '.', '!', '-path', './README.md', '-delete'],
-        cwd=paths['testsem']
-      )
-    except:
-      logger.fatal('Failed to delete old build results')
+      clean_tests(paths, keep_tests=(args.type == 'speed'))
+    except OSError as e:
+      logger.fatal(f"Failed to delete old build results: {e}")
   else:
     prebuilt = False
 
@@ -114,33 +139,33 @@ def main():
     # copy core-native config
     logger.info(f"Copying EMBench config from {paths['libcfg']} to {paths['emcfg']}")
     try:
-      subprocess.run(
-        ['cp', '-R', paths['libcfg'], paths['emcfg']]
-      )
-    except:
-      logger.fatal('EMBench config copy failed')
+      shutil.copytree(paths['libcfg'], paths['emcfg'], symlinks=True)
+    except OSError as e:
+      logger.fatal(f"EMBench config copy failed: {e}")
 
     # copy source files from bsp
     # Only done when testing speed, size benchmark is built without support
     # to matchEMBench baseline
     if args.type == 'speed':
       logger.info(f"Copying files from {paths['bsp']} to {paths['embrd']}")
-      for file in os.listdir(paths['bsp']):
+      for file in sorted(os.listdir(paths['bsp'])):
         if file.endswith('.S') or file.endswith('.c') or file.endswith('.h'):
-          logger.info(f"Copying {file}")
           try:
-            subprocess.run(['cp', paths['bsp']+'/'+file, paths['embrd']])
-          except:
-            logger.fatal(f"EMBench bsp copy of file {file} failed")
+            if stage_file(os.path.join(paths['bsp'], file), os.path.join(paths['embrd'], file), manifest):
+              logger.info(f"Copying {file}")
+          except OSError as e:
+            logger.fatal(f"EMBench bsp copy of file {file} failed: {e}")
 
     # copy python module
     logger.info(f"Symlinking {paths['libpy']}/run_corev32.py to {paths['empy']}/run_corev32.py")
     try:
-      subprocess.run(
-        ['ln', '-s', f"{paths['libpy']}/run_corev32.py", f"{paths['empy']}/run_corev32.py"]
-      )
-    except:
-      logger.fatal('EMBench python module copy failed')
+      os.symlink(f"{paths['libpy']}/run_corev32.py", f"{paths['empy']}/run_corev32.py")
+    except FileExistsError:
+      pass
+    except OSError as e:
+      logger.fatal(f"EMBench python module copy failed: {e}")
+
+  times['staging'] += time.time() - start
 
   # ----------------------------------------------------------------------------------------------
   # build benchmark object files (build_all.py)
@@ -156,6 +181,7 @@ def main():
          f'--ldflags=-T{paths["bsp"]}/link.ld',
          '--clean']
   logger.info(f"Calling build script: {' '.join(cmd)}")
+  start = time.time()
   try:
     res = subprocess.run(
       cmd,
@@ -172,6 +198,8 @@ def main():
     logger.info(line.rstrip())
   fh.close()
 
+  times['build'] += time.time() - start
+
   if build_passed(res.stdout.decode('utf-8')):
     logger.info(f"EMBench for {args.type} built successfully")
   else:
@@ -181,25 +209,31 @@ def main():
   # build test directory, copy and rename the executable test files, and generate yaml files
   # This is not done if the built files are for the size benchmark, as these are not able to run
   if args.type == 'speed':
-    for folder in os.listdir(paths['emres']):
+    start = time.time()
+    copied = 0
+    folders = sorted(os.listdir(paths['emres']))
+    # Test directories of benchmarks no longer built
+    clean_tests(paths, keep_tests=True, keep=[f"emb_{folder}" for folder in folders])
+    for folder in folders:
       # create test directory
       folder_ext = f"emb_{folder}"
 
       logger.debug(f"Creating folder {paths['testsem']}/{folder_ext}")
       try:
-        subprocess.run(['mkdir', f"{paths['testsem']}/{folder_ext}"])
-      except:
-        logger.fatal(f"Failed to generate folder {paths['testsem']}/{folder_ext}")
+        os.makedirs(f"{paths['testsem']}/{folder_ext}", exist_ok=True)
+      except OSError as e:
+        logger.fatal(f"Failed to generate folder {paths['testsem']}/{folder_ext}: {e}")
         sys.exit(1)
 
       # copy test files into the tests/programs/embench directories
-      for file in os.listdir(f"{paths['emres']}/{folder}"):
+      for file in sorted(os.listdir(f"{paths['emres']}/{folder}")):
         if not file.endswith('.o'):
           logger.debug(f"Copying file {file}")
           try:
-            subprocess.run(['cp', f"{paths['emres']}/{folder}/{file}", f"{paths['testsem']}/{folder_ext}/emb_{file}.elf"])
-          except:
-            logger.fatal(f"Copying file {file} to {paths['emres']}/{folder_ext}/ failed")
+            copied += stage_file(f"{paths['emres']}/{folder}/{file}",
+                                 f"{paths['testsem']}/{folder_ext}/emb_{file}.elf", manifest)
+          except OSError as e:
+            logger.fatal(f"Copying file {file} to {paths['testsem']}/{folder_ext}/ failed: {e}")
             sys.exit(1)
 
           break
@@ -208,8 +242,13 @@ def main():
       logger.debug(f"Rendering template: test.yaml.j2 for test: {folder_ext}")
       generate_test_yaml(f"{paths['testsem']}/{folder_ext}", folder_ext)
 
+    logger.info(f"Staged {len(folders)} benchmark tests, {len(folders) - copied} unchanged")
+    times['staging'] += time.time() - start
+
+  cv_cache.save_json(manifest_path, {dst: state for dst, state in manifest.items() if os.path.exists(dst)})
 
   if build_only:
+    log_times(times)
     logger.info("Build only selected, exiting")
     sys.exit()
 
@@ -217,13 +256,17 @@ def main():
   # run benchmark script (benchmark_speed.py or benchmark_size.py)
   # ----------------------------------------------------------------------------------------------
   logger.info(f"Starting benchmarking of {args.type}")
+  start = time.time()
 
   if args.type == 'speed':
     arglist = ['benchmark_speed.py', '--target-module=run_corev32',
                f'--cpu-mhz={args.cpu_mhz}', f'--make-path={paths["make"]}',
                f'--timeout={args.timeout}',
                f'--simulator={args.simulator}']
-    if parallel:
+    if args.jobs > 0:
+      # Simulations scheduled here, benchmark_speed.py scores their results
+      arglist = [sys.executable, '-c', SCORE_SPEED, run_speed_jobs(args, paths)] + arglist[1:]
+    elif parallel:
         arglist.append(f'--sim-parallel')
   else:
     arglist = ['benchmark_size.py']
@@ -240,11 +283,14 @@ def main():
   except:
       logger.fatal(f"EMBench script benchmark_{args.type}.py failed")
       sys.exit(1)
+  stdout_str = res.stdout.decode('utf-8')
 
+  times['run'] += time.time() - start
   logger.info('Complete with benchmark run')
+  log_times(times)
 
   # Check if benchmark run succeeded
-  if not run_passed(res.stdout.decode('utf-8'), args.type):
+  if not run_passed(stdout_str, args.type):
     logger.fatal(f"EMBench benchmark run failed")
     log_file = get_log_file(args.core, paths, args.type)
     if log_file:
@@ -259,7 +305,7 @@ def main():
   fh.close()
 
   # Check results if a target was applied
-  if check_result(res.stdout.decode('utf-8'), args.target, args.type) and args.target != 0:
+  if check_result(stdout_str, args.target, args.type) and args.target != 0:
     logger.info(f"Benchmark run met target")
   elif args.target != 0:
     logger.info(f"Benchmark run failed to meet the target: {args.target}")
@@ -295,6 +341,30 @@ def build_parser():
     )
   )
 
+  parser.add_argument(
+    '-j',
+    '--jobs',
+    type=int,
+    default=0,
+    help=(
+      'Number of benchmark simulations to run at a time, scheduled by this script\n'+
+      'instead of benchmark_speed.py (0: use benchmark_speed.py, see --parallel)\n'+
+      'benchmark_speed.py still scores the results\n'+
+      'The benchmarks run with COMP=0 on the existing testbench compile, see --compile\n'+
+      'makefile alias: EMB_JOBS'
+    )
+  )
+
+  parser.add_argument(
+    '--compile',
+    default='NO',
+    help=(
+      'Set this option to "YES" to compile the testbench before the benchmarks\n'+
+      'run with --jobs, instead of using the existing compile\n'+
+      'makefile alias: EMB_COMPILE'
+    )
+  )
+
   parser.add_argument(
     '-t',
     '--type',
@@ -393,13 +463,130 @@ def build_paths(core):
 
   return paths
 
+def run_benchmark(target, bench, target_args, timeout):
+  """Simulate one benchmark with the core's EMBench target module, returns
+     the (RES: cycle count, elapsed time in ms), the time is 0.0 if the run failed"""
+  cmd = target.build_benchmark_cmd(bench, target_args)
+  # The benchmarks run on the existing (or --compile) testbench compile
+  if 'COMP=0' not in cmd:
+    cmd.append('COMP=0')
+  logger.debug(f"Running: {' '.join(cmd)}")
+  # In its own session, so that a timeout kills the simulator along with make
+  proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+  try:
+    stdout, stderr = proc.communicate(timeout=int(timeout))
+  except subprocess.TimeoutExpired:
+    try:
+      os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+      pass
+    proc.communicate()
+    logger.info(f"Benchmark {bench} timed out after {timeout}s")
+    return None, 0.0
+
+  stdout_str = stdout.decode('utf-8', errors='replace')
+  rcstr = re.search('RES: (\d+)', stdout_str)
+  return (int(rcstr.group(1)) if rcstr else None,
+          target.decode_results(stdout_str, stderr.decode('utf-8', errors='replace')))
+
+def run_speed_jobs(args, paths):
+  """Run the speed benchmarks on a pool of args.jobs simulations, collecting the
+     results as they complete. Returns a JSON file of the elapsed times in ms,
+     scored by benchmark_speed.py with SCORE_SPEED"""
+  # The target module (and its embench_core dependency) from the EMBench checkout
+  sys.path.insert(0, paths['empy'])
+  import run_corev32 as target
+  target_args = target.get_target_args([f'--cpu-mhz={args.cpu_mhz}', f'--make-path={paths["make"]}',
+                                        f'--simulator={args.simulator}'])
+
+  with open(os.path.join(paths['embench'], 'baseline-data', 'speed.json')) as fh:
+    baseline = json.load(fh)
+  benchmarks = sorted(b for b in os.listdir(paths['emres']) if b in baseline)
+
+  if args.compile == 'YES':
+    cmd = ['make', '-C', paths['make'], 'comp', f'SIMULATOR={args.simulator}']
+    logger.info(f"Compiling testbench: {' '.join(cmd)}")
+    if subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT).returncode != 0:
+      logger.fatal('Testbench compile failed')
+      sys.exit(1)
+
+  logger.info(f"Running {len(benchmarks)} benchmarks, {args.jobs} at a time")
+  times = {}
+  with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pool:
+    futures = {pool.submit(run_benchmark, target, bench, target_args, args.timeout): bench for bench in benchmarks}
+    for f in concurrent.futures.as_completed(futures):
+      bench = futures[f]
+      cycles, times[bench] = f.result()
+      if times[bench]:
+        logger.info(f"Benchmark {bench}: {cycles} cycles, {times[bench]:.3f} ms ({len(times)}/{len(benchmarks)})")
+      else:
+        logger.info(f"Benchmark {bench}: FAILED ({len(times)}/{len(benchmarks)})")
+
+  os.makedirs(paths['emb_logs'], exist_ok=True)
+  times_file = os.path.join(paths['emb_logs'], 'speed-jobs.json')
+  with open(times_file, 'w') as fh:
+    json.dump(times, fh, indent=2)
+  return times_file
+
+def clean_tests(paths, keep_tests=False, keep=None):
+  """Delete the contents of the embench test programs directory but its README.md.
+     With keep_tests the emb_* test directories are kept, only those in keep if given"""
+  for entry in os.scandir(paths['testsem']):
+    if entry.name == 'README.md':
+      continue
+    if keep_tests and entry.name.startswith('emb_') and (keep is None or entry.name in keep):
+      continue
+    logger.debug(f"Deleting {entry.path}")
+    if entry.is_dir(follow_symlinks=False):
+      shutil.rmtree(entry.path)
+    else:
+      os.remove(entry.path)
+
+def file_hash(path):
+  """SHA-1 of the content of a file"""
+  digest = hashlib.sha1()
+  with open(path, 'rb') as fh:
+    for block in iter(lambda: fh.read(1 << 20), b''):
+      digest.update(block)
+  return digest.hexdigest()
+
+def stage_file(src, dst, manifest):
+  """Copy src to dst unless dst already holds its content, returns True if the file was copied.
+     The manifest records the stat and content hash of the source of each staged file:
+     an untouched source is not even read, and a rebuilt one with the same content
+     (the benchmark ELFs after build_all.py --clean) leaves dst and its mtime alone"""
+  st = os.stat(src)
+  entry = manifest.get(dst)
+  staged = entry is not None and os.path.exists(dst)
+  if staged and entry[:3] == [src, st.st_size, st.st_mtime_ns]:
+    return False
+
+  digest = file_hash(src)
+  manifest[dst] = [src, st.st_size, st.st_mtime_ns, digest]
+  if staged and entry[3:] == [digest] and os.path.getsize(dst) == st.st_size:
+    return False
+  shutil.copyfile(src, dst)
+  return True
+
+def log_times(times):
+  logger.info(f"Time spent staging: {times['staging']:.1f}s, building: {times['build']:.1f}s, "
+              f"running: {times['run']:.1f}s")
+
 def generate_test_yaml(folder, test_name):
   env = jinja2.Environment(loader=jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__),
                                                         'templates')), trim_blocks=True)
   template = env.get_template('embench_test.yaml.j2')
 
+  # Left untouched when unchanged
+  content = template.render(name=test_name)
+  try:
+    with open(f"{folder}/test.yaml", 'r') as fh:
+      if fh.read() == content:
+        return
+  except OSError:
+    pass
   out = open(f"{folder}/test.yaml", 'w')
-  out.write(template.render(name=test_name))
+  out.write(content)
   out.close()
 
 def build_passed(stdout_str):
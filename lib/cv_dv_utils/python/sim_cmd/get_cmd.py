@@ -21,9 +21,13 @@ import os
 import yaml
 import re
 
+# The libyaml (C) loader where PyYAML was built with it
+def load_yaml(stream):
+  return yaml.load(stream, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
 def cmp_cmd(yaml_file, outdir, opt, vopt_option, work):
   with open(yaml_file, 'r') as yaml_top:
-     sim_yaml = yaml.safe_load(yaml_top)
+     sim_yaml = load_yaml(yaml_top)
   
   
   for entry in sim_yaml: 
@@ -137,7 +141,7 @@ def cmp_cmd(yaml_file, outdir, opt, vopt_option, work):
 
 def get_cmd_opt(yaml_file):
   with open(yaml_file, 'r') as yaml_top:
-     sim_yaml = yaml.safe_load(yaml_top)
+     sim_yaml = load_yaml(yaml_top)
   
   for entry in sim_yaml: 
       if entry['tool'] == "questa":
@@ -199,13 +199,21 @@ else
 YAML2MAKE_DEBUG =
 endif
 
+# Fragments precomputed for a whole regression by yaml2make --batch/--regress
+# and cfgyaml2make --outdir are included from YAML2MAKE_FRAGMENTS when present
+# instead of running the scripts for every make invocation
+YAML2MAKE_FRAGMENTS ?=
+
 # If the gen_corev-dv target is defined then read in a test defintions file
 YAML2MAKE = $(CORE_V_VERIF)/bin/yaml2make
 ifneq ($(filter gen_corev-dv,$(MAKECMDGOALS)),)
 ifeq ($(TEST),)
 $(error ERROR must specify a TEST variable with gen_corev-dv target)
 endif
+GEN_FLAGS_MAKE := $(if $(YAML2MAKE_FRAGMENTS),$(wildcard $(YAML2MAKE_FRAGMENTS)/corev-dv.yaml/GEN/$(TEST).0.mk))
+ifeq ($(GEN_FLAGS_MAKE),)
 GEN_FLAGS_MAKE := $(shell $(YAML2MAKE) --test=$(TEST) --yaml=corev-dv.yaml $(YAML2MAKE_DEBUG) --prefix=GEN --core=$(CV_CORE))
+endif
 ifeq ($(GEN_FLAGS_MAKE),)
 $(error ERROR Could not find corev-dv.yaml for test: $(TEST))
 endif
@@ -218,7 +226,10 @@ ifneq ($(filter $(TEST_YAML_PARSE_TARGETS),$(MAKECMDGOALS)),)
 ifeq ($(TEST),)
 $(error ERROR! must specify a TEST variable)
 endif
+TEST_FLAGS_MAKE := $(if $(YAML2MAKE_FRAGMENTS),$(wildcard $(YAML2MAKE_FRAGMENTS)/test.yaml/TEST/$(TEST).$(RUN_INDEX).mk))
+ifeq ($(TEST_FLAGS_MAKE),)
 TEST_FLAGS_MAKE := $(shell $(YAML2MAKE) --test=$(TEST) --yaml=test.yaml  $(YAML2MAKE_DEBUG) --run-index=$(u) --prefix=TEST --core=$(CV_CORE))
+endif
 ifeq ($(TEST_FLAGS_MAKE),)
 $(error ERROR Could not find test.yaml for test: $(TEST))
 endif
@@ -231,7 +242,10 @@ CFGYAML2MAKE = $(CORE_V_VERIF)/bin/cfgyaml2make
 CFG_YAML_PARSE_TARGETS=comp ldgen comp_corev-dv gen_corev-dv test hex clean_hex corev-dv sanity-veri-run bsp
 ifneq ($(filter $(CFG_YAML_PARSE_TARGETS),$(MAKECMDGOALS)),)
 ifneq ($(CFG),)
+CFG_FLAGS_MAKE := $(if $(YAML2MAKE_FRAGMENTS),$(wildcard $(YAML2MAKE_FRAGMENTS)/cfg/CFG/$(CFG).mk))
+ifeq ($(CFG_FLAGS_MAKE),)
 CFG_FLAGS_MAKE := $(shell $(CFGYAML2MAKE) --yaml=$(CFG).yaml $(YAML2MAKE_DEBUG) --prefix=CFG --core=$(CV_CORE))
+endif
 ifeq ($(CFG_FLAGS_MAKE),)
 $(error ERROR Error finding or parsing configuration: $(CFG).yaml)
 endif
@@ -414,6 +428,12 @@ ifeq ($(shell echo $(TEST) | head -c 6),corev_)
 export OPT_RUN_INDEX_SUFFIX=_$(RUN_INDEX)
 endif
 
+# Number of processes objdump2itb uses to parse the objdump of an ELF
+OBJDUMP2ITB_JOBS ?= 1
+
+# Optional directory where objdump2itb caches .itb files keyed by ELF contents
+OBJDUMP2ITB_CACHE ?=
+
 ###############################################################################
 # Rule to generate hex (loadable by simulators) from elf
 #    $@ is the file being generated.
@@ -434,13 +454,12 @@ endif
 		-M numeric \
 		-S \
 		$*.elf > $*.objdump
-	$(RISCV_EXE_PREFIX)objdump \
-    	-d \
-        -S \
-		-M no-aliases \
-		-M numeric \
-        -l \
-		$*.elf | ${CORE_V_VERIF}/bin/objdump2itb - > $*.itb
+	${CORE_V_VERIF}/bin/objdump2itb \
+		--elf $*.elf \
+		--objdump $(RISCV_EXE_PREFIX)objdump \
+		--jobs $(OBJDUMP2ITB_JOBS) \
+		$(if $(OBJDUMP2ITB_CACHE),--cache-dir $(OBJDUMP2ITB_CACHE)) \
+		--outfile $*.itb
 
 # Patterned targets to generate ELF.  Used only if explicit targets do not match.
 #
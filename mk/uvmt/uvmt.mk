@@ -97,9 +97,12 @@ EMB_TYPE           ?= speed
 EMB_TARGET         ?= 0
 EMB_CPU_MHZ        ?= 1
 EMB_TIMEOUT        ?= 3600
+EMB_JOBS           ?= 0
+EMB_COMPILE        ?= NO
 EMB_PARALLEL_ARG    = $(if $(filter $(YES_VALS),$(EMB_PARALLEL)),YES,NO)
 EMB_BUILD_ONLY_ARG  = $(if $(filter $(YES_VALS),$(EMB_BUILD_ONLY)),YES,NO)
 EMB_DEBUG_ARG       = $(if $(filter $(YES_VALS),$(EMB_DEBUG)),YES,NO)
+EMB_COMPILE_ARG     = $(if $(filter $(YES_VALS),$(EMB_COMPILE)),YES,NO)
 
 # UVM Environment
 export DV_UVMT_PATH             = $(CORE_V_VERIF)/$(CV_CORE_LC)/tb/uvmt
@@ -314,6 +317,8 @@ embench: $(EMBENCH_PKG)
 		-t $(EMB_TYPE) \
 		--timeout $(EMB_TIMEOUT) \
 		--parallel $(EMB_PARALLEL_ARG) \
+		--jobs $(EMB_JOBS) \
+		--compile $(EMB_COMPILE_ARG) \
 		-b $(EMB_BUILD_ONLY_ARG) \
 		-tgt $(EMB_TARGET) \
 		-f $(EMB_CPU_MHZ) \